@@ -1,95 +1,215 @@
 import shlex
 import subprocess
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 import shutil
 import warnings
 import concurrent.futures
 
 import pandas as pd
-from Bio import SeqIO
 from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
 
 from . import resources as rsc
+from .cache import memoize_annotate
 from .infernal import parse_infernal
 
 log = NamedTemporaryFile()
 
+# default blastn search settings -- any flag set in a database's `parameters`
+# takes precedence over the matching default
+BLASTN_DEFAULTS = {
+    "-task": "dc-megablast",
+    "-evalue": "1e-5",
+    "-word_size": "11",
+    "-culling_limit": "1",
+}
+
+
+def _merge_parameters(defaults, parameters):
+    # flags given in `parameters` override the defaults key-by-key
+    args = shlex.split(parameters)
+    flags = {arg for arg in args if arg.startswith("-")}
+    merged = []
+    for flag, value in defaults.items():
+        if flag not in flags:
+            merged += [flag, value]
+    return shlex.join(merged + args)
+
+
+def _cap_threads(parameters, flag, max_threads=None):
+    # clamps a user-supplied thread count to rsc.get_max_threads() (or
+    # `max_threads`), or sets the flag at the cap if it has no value
+    threads = max_threads or rsc.get_max_threads()
+    args = shlex.split(parameters)
+    if flag not in args:
+        args += [flag, str(threads)]
+    else:
+        idx = args.index(flag) + 1
+        if idx == len(args) or args[idx].startswith("-"):
+            args.insert(idx, str(threads))
+        else:
+            try:
+                threads = min(int(args[idx]), threads)
+            except ValueError:
+                pass
+            args[idx] = str(threads)
+    return shlex.join(args), threads
+
+
+# dtypes of the tabular (-outfmt 6) columns requested from blastn/diamond
+HIT_DTYPES = {
+    "qseqid": str,
+    "qstart": "int32",
+    "qend": "int32",
+    "sseqid": str,
+    "pident": "float64",
+    "slen": "int32",
+    "qseq": str,
+    "length": "int32",
+    "sstart": "int32",
+    "send": "int32",
+    "qlen": "int32",
+    "evalue": "float64",
+}
+
+
+def _read_hits(file_loc, flags):
+    # parses tabular search output with pandas' C reader; None if there are no hits
+    names = flags.split()
+    try:
+        return pd.read_csv(
+            file_loc,
+            sep="\t",
+            header=None,
+            names=names,
+            dtype={name: HIT_DTYPES[name] for name in names},
+        )
+    except (pd.errors.EmptyDataError, FileNotFoundError):
+        # no output file is written if the search itself failed
+        return None
+
+
+def _run(cmd):
+    # results are written to files, so stdout is discarded and stderr is only
+    # decoded if the tool fails
+    result = subprocess.run(
+        shlex.split(cmd),
+        shell=False,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", "replace").strip()
+        warnings.warn(f"{cmd.split()[0]} exited with status {result.returncode}: {stderr}")
+    return result
+
+
+def _as_text(seq):
+    if isinstance(seq, (bytes, bytearray)):
+        return seq.decode("ascii")
+    return str(seq)
+
+
+def _write_queries(records, file_loc):
+    # queries are written with positional ids (q0, q1, ...) as the search tools
+    # truncate ids at the first whitespace; all records are joined up front so
+    # the query file is written in one go
+    payload = "".join(f">q{i}\n{seq}\n" for i, (_, seq) in enumerate(records))
+    with open(file_loc, "wb") as file_handle:
+        file_handle.write(payload.encode())
+
+
+def _split_queries(inDf, qseqids, records, columns):
+    # de-multiplexes a batched search back into one DataFrame per query,
+    # mapping the positional ids back to the caller's ids
+    hits = {qid: pd.DataFrame(columns=columns) for qid, _ in records}
+    for qseqid, group in inDf.groupby(qseqids.astype(str), sort=False):
+        hits[records[int(qseqid[1:])][0]] = group.reset_index(drop=True)
+    return hits
+
+
+def _search_failed(hits):
+    # marks the results of a search that was skipped or exited non-zero, so
+    # they can be told apart from a search that found nothing
+    for inDf in hits.values():
+        inDf.attrs["search_failed"] = True
+    return hits
+
 
 def BLAST(seq, db):
+    # a list of (id, seq) pairs is written to a single query file and searched
+    # in one tool invocation, so the database is only loaded once; the hits are
+    # returned as a dict of DataFrames keyed by query id
+    if isinstance(seq, tuple) or (
+        isinstance(seq, list)
+        and not all(isinstance(record, tuple) and len(record) == 2 for record in seq)
+    ):
+        raise TypeError("BLAST expects a sequence or a list of (id, seq) tuples")
+    if not isinstance(seq, list):
+        return BLAST([("temp", seq)], db)["temp"]
+
+    records = [(qid, _as_text(query)) for qid, query in seq]
+    if len({qid for qid, _ in records}) != len(records):
+        raise ValueError("query ids passed to BLAST must be unique")
     task = db["method"]
     columns=['qstart', 'qend', 'sseqid', 'sframe', 'pident', 'slen', 'qseq', 'length', 'sstart', 'send', 'qlen', 'evalue']
+    no_hits = {qid: pd.DataFrame(columns=columns) for qid, _ in records}
 
     if task == "blastn":
         if not shutil.which("blastn"):
             warnings.warn("blastn not found in PATH, skipping blastn search. You can install it with 'conda install -c bioconda blast' or your system's package manager.")
-            return pd.DataFrame(columns=columns)
-        
-        query = NamedTemporaryFile(delete=False)
-        tmp = NamedTemporaryFile(delete=False)
-        SeqIO.write(SeqRecord(Seq(seq), id="temp"), query.name, "fasta")
-
-        flags = "qstart qend sseqid pident slen qseq length sstart send qlen evalue"
-        cmd = (
-            f"blastn -db {db['db_loc']} -query {query.name} -out {tmp.name} "
-            f"{db['parameters']} -outfmt '6 {flags}'"
-        )
-        _ = subprocess.run(
-            shlex.split(cmd),
-            shell=False,
-            capture_output=True,
-            text=True,
-        )
+            return _search_failed(no_hits)
         
-        with open(tmp.name, "r") as file_handle:
-            align = file_handle.readlines()
-
-        tmp.close()
-        query.close()
+        parameters = _merge_parameters(BLASTN_DEFAULTS, db["parameters"])
+        parameters, threads = _cap_threads(parameters, "-num_threads")
+        # batches split threads across queries rather than across the database;
+        # a single query keeps the default mode so the threads are still used
+        if threads > 1 and len(records) > 1 and "-mt_mode" not in parameters:
+            parameters += " -mt_mode 1"
+
+        flags = "qseqid qstart qend sseqid pident slen qseq length sstart send qlen evalue"
+        with TemporaryDirectory() as scratch:
+            query = f"{scratch}/query.fa"
+            out = f"{scratch}/hits.tsv"
+            _write_queries(records, query)
+            cmd = (
+                f"blastn -db {db['db_loc']} -query {query} -out {out} "
+                f"{parameters} -outfmt '6 {flags}'"
+            )
+            failed = _run(cmd).returncode != 0
+            inDf = _read_hits(out, flags)
         
-        if not align:
-            return pd.DataFrame(columns=columns)
+        if inDf is None or inDf.empty:
+            return _search_failed(no_hits) if failed else no_hits
 
-        inDf = pd.DataFrame([ele.split() for ele in align], columns=flags.split())
-        inDf = inDf.apply(pd.to_numeric, errors="ignore")
+        qseqids = inDf.pop("qseqid")
 
         inDf["sframe"] = (inDf["qstart"] < inDf["qend"]).astype(int).replace(0, -1)
         inDf["length"] = abs(inDf["qend"] - inDf["qstart"]) + 1
 
-        return inDf
+        hits = _split_queries(inDf, qseqids, records, columns)
+        return _search_failed(hits) if failed else hits
 
     elif task == "diamond":
         if not shutil.which("diamond"):
             warnings.warn("diamond not found in PATH, skipping diamond search. You can install it with 'conda install -c bioconda diamond' or your system's package manager.")
-            return pd.DataFrame(columns=columns)
-        
-        query = NamedTemporaryFile(delete=False)
-        tmp = NamedTemporaryFile(delete=False)
-        SeqIO.write(SeqRecord(Seq(seq), id="temp"), query.name, "fasta")
-
-        flags = "qstart qend sseqid pident slen qseq length sstart send qlen evalue"
-        cmd = (
-            f"diamond blastx -d {db['db_loc']} -q {query.name} -o {tmp.name} "
-            f"{db['parameters']} --outfmt 6 {flags}"
-        )
-        _ = subprocess.run(
-            shlex.split(cmd),
-            shell=False,
-            capture_output=True,
-            text=True,
-        )
+            return _search_failed(no_hits)
         
-        with open(tmp.name, "r") as file_handle:  # opens BLAST file
-            align = file_handle.readlines()
-
-        tmp.close()
-        query.close()
+        flags = "qseqid qstart qend sseqid pident slen qseq length sstart send qlen evalue"
+        with TemporaryDirectory() as scratch:
+            query = f"{scratch}/query.fa"
+            out = f"{scratch}/hits.tsv"
+            _write_queries(records, query)
+            cmd = (
+                f"diamond blastx -d {db['db_loc']} -q {query} -o {out} "
+                f"{db['parameters']} --outfmt 6 {flags}"
+            )
+            failed = _run(cmd).returncode != 0
+            inDf = _read_hits(out, flags)
         
-        if not align:
-            return pd.DataFrame(columns=columns)
+        if inDf is None or inDf.empty:
+            return _search_failed(no_hits) if failed else no_hits
 
-        inDf = pd.DataFrame([ele.split() for ele in align], columns=flags.split())
-        inDf = inDf.apply(pd.to_numeric, errors="ignore")
+        qseqids = inDf.pop("qseqid")
 
         try:
             inDf["sseqid"] = inDf["sseqid"].str.split("|", n=2, expand=True)[1]
@@ -99,41 +219,55 @@ def BLAST(seq, db):
         inDf["slen"] = inDf["slen"] * 3
         inDf["length"] = abs(inDf["qend"] - inDf["qstart"]) + 1
 
-        return inDf
+        hits = _split_queries(inDf, qseqids, records, columns)
+        return _search_failed(hits) if failed else hits
 
     elif task == "infernal":
         if not shutil.which("cmscan"):
             warnings.warn("cmscan not found in PATH, skipping infernal search. You can install it with 'conda install -c bioconda infernal' or your system's package manager.")
-            return pd.DataFrame(columns=columns)
-        
-        query = NamedTemporaryFile(delete=False)
-        tmp = NamedTemporaryFile(delete=False)
-        SeqIO.write(SeqRecord(Seq(seq), id="temp"), query.name, "fasta")
-
-        flags = "--cut_ga --rfam --noali --nohmmonly --fmt 2"
-        cmd = f"cmscan {flags} {db['parameters']} --tblout {tmp.name} {db['db_loc']} {query.name}"
-        _ = subprocess.run(
-            shlex.split(cmd),
-            shell=False,
-            capture_output=True,
-            text=True,
+            return _search_failed(no_hits)
+
+        # parse_infernal does not keep the query name, so cmscan is run once
+        # per query -- these runs are I/O bound and independent, so they are
+        # fanned out with the thread cap split between them
+        max_threads = rsc.get_max_threads()
+        if len(records) == 1:
+            qid, query = records[0]
+            return {qid: _cmscan(query, db, max_threads)}
+
+        workers = min(len(records), max_threads)
+        threads = max(1, max_threads // workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            hits = executor.map(lambda record: _cmscan(record[1], db, threads), records)
+            return {qid: inDf for (qid, _), inDf in zip(records, hits)}
+
+    return no_hits
+
+
+def _cmscan(seq, db, threads=None):
+    flags = "--cut_ga --rfam --noali --nohmmonly --fmt 2"
+    parameters, _ = _cap_threads(db["parameters"], "--cpu", threads)
+    with TemporaryDirectory() as scratch:
+        query = f"{scratch}/query.fa"
+        out = f"{scratch}/hits.tblout"
+        _write_queries([("temp", seq)], query)
+        # cmscan may not write the table if it fails -- an empty one parses to no hits
+        open(out, "w").close()
+        cmd = f"cmscan {flags} {parameters} --tblout {out} {db['db_loc']} {query}"
+        failed = _run(cmd).returncode != 0
+        inDf = parse_infernal(out)
+
+    inDf["qlen"] = len(seq)
+
+    # manually gets DNA sequence from seq(x2)
+    if not inDf.empty:
+        inDf["qseq"] = inDf.apply(
+            lambda x: (seq)[x["qstart"] : x["qend"] + 1].upper(), axis=1
         )
-        inDf = parse_infernal(tmp.name)
-
-        inDf["qlen"] = len(seq)
-
-        # manually gets DNA sequence from seq(x2)
-        if not inDf.empty:
-            inDf["qseq"] = inDf.apply(
-                lambda x: (seq)[x["qstart"] : x["qend"] + 1].upper(), axis=1
-            )
-
-        tmp.close()
-        query.close()
 
-        return inDf
-
-    return pd.DataFrame(columns=columns)
+    if failed:
+        inDf.attrs["search_failed"] = True
+    return inDf
 
 
 def calculate(inDf, is_linear):
@@ -212,37 +346,30 @@ def clean(inDf):
     # for some reason some int columns are behaving as floats -- this converts them
     inDf = inDf.apply(pd.to_numeric, errors="ignore", downcast="integer")
 
-    for i in inDf.index:
-        # end    = inDf['qlen'][0]
-        wstart = inDf.loc[i]["wstart"]  # changed from qstart
-        wend = inDf.loc[i]["wend"]  # changed from qend
-
-        sseqid = [inDf.loc[i]["sseqid"]]
-
+    # itertuples avoids building a Series for every row lookup
+    hits = inDf[["sseqid", "wstart", "wend", "kind"]].itertuples(index=False, name=None)
+    for sseqid, wstart, wend, kind in hits:  # wstart/wend changed from qstart/qend
         if wend < wstart:  # if hit crosses ori
-            left = (wend + 1) * [inDf.loc[i]["kind"]]
+            left = (wend + 1) * [kind]
             center = (wstart - wend - 1) * [None]
-            right = (end - wstart + 0) * [inDf.loc[i]["kind"]]
+            right = (end - wstart + 0) * [kind]
         else:  # if normal
             left = wstart * [None]
-            center = (wend - wstart + 1) * [inDf.loc[i]["kind"]]
+            center = (wend - wstart + 1) * [kind]
             right = (end - wend - 1) * [None]
 
-        seqSpace.append(sseqid + left + center + right)  # index, not append
+        seqSpace.append([sseqid] + left + center + right)  # index, not append
 
     seqSpace = pd.DataFrame(seqSpace, columns=["sseqid"] + list(range(0, end)))
     seqSpace = seqSpace.set_index([seqSpace.index, "sseqid"])  # multi-indexed
     # filter through overlaps in sequence space
     toDrop = set()
-    for i in range(len(seqSpace)):
-        if seqSpace.iloc[i].name in toDrop:
+    end = inDf["qlen"][0]  # redundant, but more readable
+    hits = inDf[["qstart", "qend", "kind"]].itertuples(index=False, name=None)
+    for i, (qstart, qend, kind) in enumerate(hits):
+        if seqSpace.index[i] in toDrop:
             continue  # need to test speed
 
-        end = inDf["qlen"][0]  # redundant, but more readable
-        qstart = inDf.loc[seqSpace.iloc[i].name[0]]["qstart"]
-        qend = inDf.loc[seqSpace.iloc[i].name[0]]["qend"]
-        kind = inDf.loc[seqSpace.iloc[i].name[0]]["kind"]
-
         # columnSlice=seqSpace.columns[(seqSpace.iloc[i]==1)] #only columns of hit
         if qstart < qend:
             columnSlice = list(range(qstart + 1, qend + 1))
@@ -305,23 +432,17 @@ def get_details(inDf, yaml_file_loc):
     problem_name = r"pdb\|(.*)\|"
     inDf["sseqid"] = inDf["sseqid"].str.replace(problem_name, r"\1", regex=True)
 
-    db_details = database["details"]
+    details_file_loc = rsc.get_details_loc(database_name, database)
 
-    if db_details["location"] == "None":
+    if details_file_loc is None:
         # if no file is passed, data should already be in dataframe
         feat_desc = inDf.loc[inDf["db"] == database_name][
             ["sseqid", "Feature", "Description"]
         ]
 
     else:
-        if db_details["location"] == "Default":
-            details_file_loc = rsc.get_details(database_name) + ".csv"
-        else:  # if a file path is passed, use that
-            details_file_loc = db_details["location"]
-
         # if the description file is compressed
-        if db_details["compressed"] is True:
-            details_file_loc += ".gz"
+        if database["details"]["compressed"] is True:
             feat_desc = parse_gz(sseqids, details_file_loc)
         else:  # if it is uncompressed
             feat_desc = pd.read_csv(details_file_loc)
@@ -362,24 +483,28 @@ def get_details(inDf, yaml_file_loc):
     return feat_desc
 
 
+@memoize_annotate
 def annotate(inSeq, yaml_file=rsc.get_yaml_path(), linear=False, is_detailed=False):
-    # This catches errors in sequence via Biopython
-    fileloc = NamedTemporaryFile()
-    SeqIO.write(
-        SeqRecord(Seq(inSeq), name="pLannotate", annotations={"molecule_type": "DNA"}),
-        fileloc.name,
-        "fasta",
-    )
-    record = list(SeqIO.parse(fileloc.name, "fasta"))
-    fileloc.close()
+    skipped = []
+    blastDf = _annotate(inSeq, yaml_file, linear, is_detailed, skipped)
+    # lists the databases whose search was skipped or failed, so incomplete
+    # results are not cached by memoize_annotate
+    blastDf.attrs["skipped_databases"] = sorted(skipped)
+    return blastDf
+
 
-    record = record[0]
+def _annotate(inSeq, yaml_file, linear, is_detailed, skipped):
+    # strips whitespace/newlines as a FASTA round trip through Biopython would,
+    # without building intermediate Seq/SeqRecord copies of the whole sequence
+    if isinstance(inSeq, (bytes, bytearray)):
+        inSeq = inSeq.decode("ascii")
+    seq = "".join(str(inSeq).split())
 
     # doubles sequence for origin crossing hits
     if linear is False:
-        query = str(record.seq) + str(record.seq)
+        query = seq + seq
     elif linear is True:
-        query = str(record.seq)
+        query = seq
     else:
         raise ValueError("linear must be a boolean")
 
@@ -388,6 +513,8 @@ def annotate(inSeq, yaml_file=rsc.get_yaml_path(), linear=False, is_detailed=Fal
     def process_database(database_tuple):
         database_name, database = database_tuple
         hits = BLAST(seq=query, db=database)
+        if hits.attrs.get("search_failed"):
+            skipped.append(database_name)
 
         if hits.empty:
             return None
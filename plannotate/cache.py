@@ -0,0 +1,141 @@
+import contextlib
+import dbm
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import shelve
+import shutil
+import warnings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from plannotate import __version__ as plannotate_version
+from plannotate import resources as rsc
+
+# Environment variable to enable the on-disk annotation cache
+CACHE_ENV = "PLANNOTATE_ANNOTATION_CACHE"
+
+# executable run by each search method in `annotate.BLAST`
+SEARCH_TOOLS = {"blastn": "blastn", "diamond": "diamond", "infernal": "cmscan"}
+
+
+def get_cache_loc():
+    """Return the location of the annotation cache shelf."""
+    return str(rsc.get_cache_root() / "annotations")
+
+
+@contextlib.contextmanager
+def _locked(cache_loc):
+    # the shelf is not safe for concurrent writers, so every access holds an
+    # exclusive lock on a sidecar file (flock also serialises threads, as each
+    # access opens its own file description)
+    with open(f"{cache_loc}.lock", "a") as lock_handle:
+        if fcntl is not None:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+
+def _tool_stamp(tool):
+    # resolved path and mtime of a search tool's executable, which both change
+    # when the tool is upgraded or a different install comes first on $PATH
+    tool_loc = shutil.which(tool) if tool else None
+    if tool_loc is None:
+        return None
+    tool_loc = os.path.realpath(tool_loc)
+    return f"{tool_loc}@{os.path.getmtime(tool_loc)}"
+
+
+def _database_mtimes(yaml_file):
+    # newest modification time of the files of each configured database, plus
+    # its feature details file and the search tool it runs
+    mtimes = []
+    for name, database in sorted(rsc.get_yaml(yaml_file).items()):
+        files = glob.glob(f"{glob.escape(database['db_loc'])}*")
+        details_file_loc = rsc.get_details_loc(name, database)
+        if details_file_loc is not None and os.path.exists(details_file_loc):
+            files.append(details_file_loc)
+        mtime = max(map(os.path.getmtime, files), default=None)
+        tool = _tool_stamp(SEARCH_TOOLS.get(database["method"]))
+        mtimes.append(f"{name}={mtime}|{tool}")
+    return ",".join(mtimes)
+
+
+def annotation_key(seq, yaml_file, linear, is_detailed):
+    """Build the cache key for a single `annotate` call.
+
+    The sequence is hashed with blake2b. The mtimes of the database YAML, of
+    each database's files and feature details file, and of the search tool
+    executables are included so that editing the configuration, updating a
+    database or upgrading a tool invalidates any previously cached results.
+    """
+    if not isinstance(seq, (bytes, bytearray)):
+        seq = str(seq).encode()
+    digest = hashlib.blake2b(seq, digest_size=16).hexdigest()
+    yaml_mtime = os.path.getmtime(yaml_file)
+    return (
+        f"{plannotate_version}:{digest}:{os.path.abspath(yaml_file)}:"
+        f"{yaml_mtime}:{_database_mtimes(yaml_file)}:{linear}:{is_detailed}"
+    )
+
+
+def memoize_annotate(func):
+    """Cache `annotate` results on disk, keyed by sequence hash.
+
+    The cache is opt-in: set the PLANNOTATE_ANNOTATION_CACHE environment
+    variable to enable it. Results are only cached when every database was
+    searched successfully -- empty results, or results listing any database in
+    their ``skipped_databases`` attribute, are recomputed on every call.
+
+    Search tools are identified by the path and mtime of their executable, not
+    their reported version; delete the cache (see `get_cache_loc`) if a tool is
+    replaced in a way that keeps both.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not os.environ.get(CACHE_ENV):
+            return func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = annotation_key(
+            bound.arguments["inSeq"],
+            bound.arguments["yaml_file"],
+            bound.arguments["linear"],
+            bound.arguments["is_detailed"],
+        )
+
+        cache_loc = get_cache_loc()
+        os.makedirs(os.path.dirname(cache_loc), exist_ok=True)
+        try:
+            with _locked(cache_loc), shelve.open(cache_loc, flag="r") as cache:
+                if key in cache:
+                    return cache[key]
+        except dbm.error:
+            # the shelf has not been created yet
+            pass
+
+        result = func(*args, **kwargs)
+
+        if result.empty or result.attrs.get("skipped_databases"):
+            return result
+
+        try:
+            with _locked(cache_loc), shelve.open(cache_loc) as cache:
+                cache[key] = result
+        except dbm.error as error:
+            warnings.warn(f"Could not write to the annotation cache at {cache_loc}: {error}")
+
+        return result
+
+    return wrapper
@@ -7,6 +7,7 @@ from importlib.resources import files
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 import hashlib
+from itertools import islice
 import tarfile
 import urllib.request
 import urllib.error
@@ -17,8 +18,10 @@ import yaml
 from platformdirs import user_cache_dir
 from tqdm import tqdm
 from Bio import SeqIO
+from Bio.File import as_handle
 from Bio.Seq import Seq
 from Bio.SeqFeature import FeatureLocation, SeqFeature
+from Bio.SeqIO.FastaIO import SimpleFastaParser
 from Bio.SeqRecord import SeqRecord
 
 from plannotate import __version__ as plannotate_version
@@ -28,6 +31,12 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 valid_genbank_exts = [".gbk", ".gb", ".gbf", ".gbff"]
 valid_fasta_exts = [".fa", ".fasta", ".fas", ".fna"]
 MAX_PLAS_SIZE = 50000
+# cmscan and blastn become I/O bound past ~4 threads and get slower, not faster
+MAX_THREADS = 4
+THREADS_ENV = "PLANNOTATE_MAX_THREADS"
+
+# LibYAML's C loader is much faster, but is not always compiled in
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 # Environment variable names for configuring database caching
 CACHE_ENV = "PLANNOTATE_DB_DIR"
@@ -54,6 +63,20 @@ def set_db_cache_dir(path):
     os.environ[CACHE_ENV] = str(path)
 
 
+def get_max_threads():
+    """Return the thread cap for external search tools.
+
+    Defaults to ``MAX_THREADS`` and can be overridden with the
+    ``PLANNOTATE_MAX_THREADS`` environment variable. Never exceeds the number
+    of available CPUs.
+    """
+    try:
+        max_threads = int(os.environ.get(THREADS_ENV, MAX_THREADS))
+    except ValueError:
+        max_threads = MAX_THREADS
+    return max(1, min(max_threads, os.cpu_count() or 1))
+
+
 def _confirm_download():
     """Determine whether the user has agreed to a database download."""
     if os.environ.get(SKIP_ENV):
@@ -231,6 +254,20 @@ def get_details(name):
     return get_resource("data", name)
 
 
+def get_details_loc(name, database):
+    """Return the feature details file for a database, or None if it has none."""
+    details = database["details"]
+    if details["location"] == "None":
+        return None
+    if details["location"] == "Default":
+        details_file_loc = get_details(name) + ".csv"
+    else:  # if a file path is passed, use that
+        details_file_loc = details["location"]
+    if details["compressed"] is True:
+        details_file_loc += ".gz"
+    return details_file_loc
+
+
 def get_name_ext(file_loc):
     base = os.path.basename(file_loc)
     name = os.path.splitext(base)[0]
@@ -240,24 +277,22 @@ def get_name_ext(file_loc):
 
 def validate_file(file, ext, max_length=MAX_PLAS_SIZE):
     if ext in valid_fasta_exts:
-        # This catches errors on file uploads via Biopython
-        temp_fileloc = NamedTemporaryFile()
-        record = list(SeqIO.parse(file, "fasta"))
-        try:
-            record[0].annotations["molecule_type"] = "DNA"
-        except IndexError:
+        # SimpleFastaParser yields (title, seq) tuples without building SeqRecords;
+        # at most two entries are read since only one is allowed
+        with as_handle(file) as handle:
+            records = list(islice(SimpleFastaParser(handle), 2))
+        if not records:
             error = (
                 "Malformed fasta file --> please submit a fasta file in standard format"
             )
             raise ValueError(error)
-        SeqIO.write(record, temp_fileloc.name, "fasta")
-        record = list(SeqIO.parse(temp_fileloc.name, "fasta"))
-        temp_fileloc.close()
 
-        if len(record) != 1:
+        if len(records) != 1:
             error = "FASTA file contains many entries --> please submit a single FASTA file."
             raise ValueError(error)
 
+        inSeq = records[0][1]
+
     elif ext in valid_genbank_exts:
         temp_fileloc = NamedTemporaryFile()
         try:
@@ -270,18 +305,18 @@ def validate_file(file, ext, max_length=MAX_PLAS_SIZE):
         record = list(SeqIO.parse(temp_fileloc.name, "fasta"))
         temp_fileloc.close()
 
+        if len(record) != 1:
+            error = (
+                "FASTA file contains many entries --> please submit a single FASTA file."
+            )
+            raise ValueError(error)
+
+        inSeq = str(record[0].seq)
+
     else:
         error = "must be a FASTA or GenBank file"
         raise ValueError(error)
 
-    if len(record) != 1:
-        error = (
-            "FASTA file contains many entries --> please submit a single FASTA file."
-        )
-        raise ValueError(error)
-
-    inSeq = str(record[0].seq)
-
     validate_sequence(inSeq, max_length)
 
     return inSeq
@@ -377,19 +412,22 @@ def get_seq_record(inDf, inSeq, is_linear=False, record=None):
     inDf["Feature"] = inDf.apply(lambda x: append_frag(x), axis=1)
 
     inDf["Type"] = inDf["Type"].str.replace("origin of replication", "rep_origin")
-    for index in inDf.index:
+    columns = ["feat loc", "Type", "Feature", "db", "pident", "percmatch", "fragment"]
+    for feat_loc, feat_type, feature, db, pident, percmatch, fragment in inDf[
+        columns
+    ].itertuples(index=False, name=None):
         record.features.append(
             SeqFeature(
-                inDf.loc[index]["feat loc"],
-                type=inDf.loc[index]["Type"],  # maybe change 'Type'
+                feat_loc,
+                type=feat_type,  # maybe change 'Type'
                 qualifiers={
                     "note": ["pLannotate"],
-                    "label": [inDf.loc[index]["Feature"]],
-                    "database": [inDf.loc[index]["db"]],
-                    "identity": [str(round(inDf.loc[index]["pident"], 1))],
-                    "match_length": [str(round(inDf.loc[index]["percmatch"], 1))],
-                    "fragment": [str(inDf.loc[index]["fragment"])],
-                    "other": [inDf.loc[index]["Type"]],
+                    "label": [feature],
+                    "database": [db],
+                    "identity": [str(round(pident, 1))],
+                    "match_length": [str(round(percmatch, 1))],
+                    "fragment": [str(fragment)],
+                    "other": [feat_type],
                 },
             )
         )  # maybe change 'Type'
@@ -453,7 +491,7 @@ def get_yaml(yaml_file_loc, db_dir=None):
     """Load database configuration from YAML and resolve data locations."""
 
     with open(yaml_file_loc, "r") as f:
-        dbs = yaml.load(f, Loader=yaml.SafeLoader)
+        dbs = yaml.load(f, Loader=YamlLoader)
 
     cache_dir = Path(db_dir) if db_dir else get_db_dir()
 
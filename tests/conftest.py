@@ -1,4 +1,107 @@
 import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tests.helpers import (
+    EXTERNAL_TOOLS,
+    GFP_PACKED,
+    TEST_DNA,
+    TEST_PROTEINS,
+    find_tools,
+    unpack2bit,
+)
 
 # Avoid network/database downloads during tests
 os.environ.setdefault("PLANNOTATE_SKIP_DB_DOWNLOAD", "1")
+
+# Keep mocked annotate() calls from reading/writing the on-disk result cache
+os.environ.pop("PLANNOTATE_ANNOTATION_CACHE", None)
+
+
+@pytest.fixture(scope="session")
+def gfp_sequence():
+    """GFP coding sequence shared by the search tests."""
+    return unpack2bit(GFP_PACKED)
+
+
+@pytest.fixture(scope="session")
+def tool_availability():
+    """Paths to the external search tools, resolved once per test session."""
+    return find_tools(EXTERNAL_TOOLS)
+
+
+def _fasta_bytes(records):
+    return "".join(f">{name}\n{seq}\n" for name, seq in records.items()).encode()
+
+
+def _start_build(cmd):
+    # launches a database build in the background; None if the tool is missing
+    if shutil.which(cmd[0]) is None:
+        return None
+    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def _wait_for_build(proc, name):
+    # tests needing a database are skipped outright if the tool to build it is
+    # missing; the *_availability tests still report the missing tool
+    if proc is None:
+        pytest.skip(f"{name} not installed")
+    _, stderr = proc.communicate()
+    assert proc.returncode == 0, f"{name} failed: {stderr.decode('utf-8', 'replace')}"
+
+
+def _start_builds(temp_dir):
+    protein_fasta = f"{temp_dir}/test_proteins.fasta"
+    protein_db = f"{temp_dir}/test_proteins"
+    dna_fasta = f"{temp_dir}/test_dna.fasta"
+    dna_db = f"{temp_dir}/test_dna"
+
+    Path(protein_fasta).write_bytes(_fasta_bytes(TEST_PROTEINS))
+    dna = {"test_dna_1|GFP_gene": unpack2bit(GFP_PACKED), **TEST_DNA}
+    Path(dna_fasta).write_bytes(_fasta_bytes(dna))
+
+    diamond = _start_build(["diamond", "makedb", "--in", protein_fasta, "--db", protein_db])
+    makeblastdb = _start_build(["makeblastdb", "-in", dna_fasta, "-dbtype", "nucl", "-out", dna_db])
+
+    return {
+        "diamond": (diamond, f"{protein_db}.dmnd"),
+        "makeblastdb": (makeblastdb, dna_db),
+    }
+
+
+@pytest.fixture(scope="session")
+def database_builds():
+    """Start building the diamond and BLAST test databases in the background.
+
+    Both builds run concurrently and each database fixture only waits on its
+    own, so whichever is requested second has usually finished already. The
+    databases are placed in RAM-backed scratch space where available.
+    """
+    scratch = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+    with tempfile.TemporaryDirectory(dir=scratch) as temp_dir:
+        builds = _start_builds(temp_dir)
+        yield builds
+        # don't remove the directory from under a build nobody waited on
+        for proc, _ in builds.values():
+            if proc is not None and proc.returncode is None:
+                proc.communicate()
+
+
+@pytest.fixture(scope="session")
+def diamond_db(database_builds):
+    """Path to a small GFP/mCherry diamond database, built once per session."""
+    proc, db_loc = database_builds["diamond"]
+    _wait_for_build(proc, "diamond")
+    return db_loc
+
+
+@pytest.fixture(scope="session")
+def blast_db(database_builds):
+    """Path to a small GFP/promoter BLAST database, built once per session."""
+    proc, db_loc = database_builds["makeblastdb"]
+    _wait_for_build(proc, "makeblastdb")
+    return db_loc
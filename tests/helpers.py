@@ -0,0 +1,77 @@
+import os
+
+EXTERNAL_TOOLS = ["diamond", "blastn", "makeblastdb", "cmscan"]
+
+# the test database is a single tiny block, so one seed-index pass is enough
+DIAMOND_TEST_PARAMETERS = "--block-size 0.001 --index-chunks 1"
+
+_BASES = "ACGT"
+# each packed byte decodes to the same four bases, so unpacking is one lookup per byte
+_UNPACK = [
+    "".join(_BASES[(byte >> shift) & 3] for shift in (6, 4, 2, 0)) for byte in range(256)
+]
+
+
+def pack2bit(seq):
+    """Pack a DNA sequence into 2 bits per base, 4 bases per byte.
+
+    The first byte holds the number of padding bases in the final byte, so
+    `unpack2bit` can recover the original length.
+    """
+    seq = seq.upper()
+    if set(seq) - set(_BASES):
+        raise ValueError("2-bit encoding only supports unambiguous A/C/G/T bases")
+    pad = -len(seq) % 4
+    codes = [_BASES.index(base) for base in seq] + [0] * pad
+    packed = bytes(
+        (a << 6) | (b << 4) | (c << 2) | d for a, b, c, d in zip(*[iter(codes)] * 4)
+    )
+    return bytes([pad]) + packed
+
+
+def unpack2bit(packed):
+    """Unpack the output of `pack2bit` into an uppercase DNA string."""
+    seq = "".join(_UNPACK[byte] for byte in packed[1:])
+    return seq[: len(seq) - packed[0]]
+
+
+# GFP coding sequence, stored 2-bit packed and only decoded where it is used
+GFP_PACKED = bytes.fromhex(
+    "003ae242a6289ef45aaeb9535eb627a1a61b01a510bd26ed698a98a98e5171a42785782f4de4516909e56e57a54576e1"
+    "45785ce9b92e7d259c5585138249187df42d65395829c6d4a264537df42861a41c42159962b82f62a6115eb8164d89e0"
+    "a9361f428a1a4135ea9109e8b1071049441b7334e961092081a4d0ae07d08d65104d8a1a49b92765851c524811553698"
+    "6956e79e561051c5e2454b595e2408550620998d13ad79e8bdb85965a8d1dda4e8627b10b0"
+)
+
+TEST_DNA = {
+    # synthetic promoter-like sequence
+    "test_dna_2|promoter": "TTGACAGCTAGCTCAGTCCTAGGTATAATGCTAGC" * 10,
+}
+
+TEST_PROTEINS = {
+    "sp|P42212|GFP_AEQVI Green fluorescent protein": (
+        "MVSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTLTYGVQCFSRYPDHMKQHDFFKSAMPEGYVQERTIFFKDDGNYKTRAEVKFEGDTLVNRIELKGIDFKEDGNILGHKLEYNYNSHNVYIMADKQKNGIKVNFKIRHNIEDGSVQLADHYQQNTPIGDGPVLLPDNHYLSTQSALSKDPNEKRDHMVLLEFVTAAGITLGMDELYK"
+    ),
+    "sp|Q9U6Y8|MCHRY_DISCR mCherry": (
+        "MVSKGEEDNMAIIKEFMRFKVHMEGSVNGHEFEIEGEGEGRPYEGTQTAKLKVTKGGPLPFAWDILSPQFMYGSKAYVKHPADIPDYLKLSFPEGFKWERVMNFEDGGVVTVTQDSSLQDGEFIYKVKLRGTNFPSDGPVMQKKTMGWEASSERMYPEDGALKGEIKQRLKLKDGGHYDAEVKTTYKAKKPVQLPGAYNVNIKLDITSHNEDYTIVEQYERAEGRHSTGGMDELYK"
+    ),
+}
+
+
+def find_tools(tools):
+    """Locate several executables with a single pass over ``$PATH``.
+
+    Equivalent to calling ``shutil.which`` on each tool, but each ``$PATH``
+    directory is only visited once.
+    """
+    found = dict.fromkeys(tools)
+    for path_dir in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        for tool in tools:
+            if found[tool] is not None:
+                continue
+            candidate = os.path.join(path_dir, tool)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                found[tool] = candidate
+        if all(found.values()):
+            break
+    return found
@@ -5,7 +5,7 @@ from tempfile import NamedTemporaryFile
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 
-from plannotate.annotate import annotate, BLAST, calculate, clean
+from plannotate.annotate import annotate, BLAST, calculate, clean, _cap_threads
 from plannotate import resources as rsc
 
 
@@ -83,6 +83,20 @@ class TestAnnotateFunction:
         call_args = mock_blast.call_args[1]
         assert call_args['seq'] == sample_dna_sequence + sample_dna_sequence
 
+    @patch('plannotate.annotate.rsc.get_yaml')
+    @patch('plannotate.annotate.BLAST')
+    def test_annotate_strips_whitespace(self, mock_blast, mock_get_yaml, sample_dna_sequence):
+        """Test that whitespace and newlines are removed from str and bytes input."""
+        mock_get_yaml.return_value = {'test_db': {'method': 'diamond', 'priority': 1}}
+        mock_blast.return_value = pd.DataFrame()
+
+        wrapped = sample_dna_sequence[:30] + "\n" + sample_dna_sequence[30:] + " \n"
+        annotate(wrapped, linear=True)
+        assert mock_blast.call_args[1]['seq'] == sample_dna_sequence
+
+        annotate(wrapped.encode(), linear=True)
+        assert mock_blast.call_args[1]['seq'] == sample_dna_sequence
+
     def test_annotate_invalid_linear_parameter(self, sample_dna_sequence):
         """Test that invalid linear parameter raises ValueError."""
         with pytest.raises(ValueError, match="linear must be a boolean"):
@@ -100,6 +114,22 @@ class TestAnnotateFunction:
         assert isinstance(result, pd.DataFrame)
         assert result.empty
 
+    @patch('plannotate.annotate.rsc.get_yaml')
+    @patch('plannotate.annotate.BLAST')
+    def test_annotate_reports_skipped_databases(self, mock_blast, mock_get_yaml, sample_dna_sequence):
+        """Test that databases whose search was skipped or failed are listed on the result."""
+        mock_get_yaml.return_value = {
+            'db1': {'method': 'diamond', 'priority': 1, 'parameters': [], 'db_loc': '/fake'},
+            'db2': {'method': 'blastn', 'priority': 1, 'parameters': [], 'db_loc': '/fake'},
+        }
+        failed = pd.DataFrame()
+        failed.attrs['search_failed'] = True
+        mock_blast.side_effect = lambda seq, db: failed if db['method'] == 'blastn' else pd.DataFrame()
+
+        result = annotate(sample_dna_sequence)
+
+        assert result.attrs['skipped_databases'] == ['db2']
+
 
 class TestBLASTFunction:
     """Tests for the BLAST function."""
@@ -110,6 +140,7 @@ class TestBLASTFunction:
             result = BLAST(sample_dna_sequence, {'method': 'blastn'})
             assert isinstance(result, pd.DataFrame)
             assert result.empty
+            assert result.attrs['search_failed']
 
     def test_blast_missing_diamond(self, sample_dna_sequence):
         """Test BLAST behavior when diamond is not available."""
@@ -117,6 +148,7 @@ class TestBLASTFunction:
             result = BLAST(sample_dna_sequence, {'method': 'diamond', 'db_loc': '/fake', 'parameters': ''})
             assert isinstance(result, pd.DataFrame)
             assert result.empty
+            assert result.attrs['search_failed']
 
     def test_blast_missing_infernal(self, sample_dna_sequence):
         """Test BLAST behavior when infernal is not available."""
@@ -124,16 +156,17 @@ class TestBLASTFunction:
             result = BLAST(sample_dna_sequence, {'method': 'infernal', 'db_loc': '/fake', 'parameters': ''})
             assert isinstance(result, pd.DataFrame)
             assert result.empty
+            assert result.attrs['search_failed']
 
     @patch('plannotate.annotate.subprocess.run')
     @patch('shutil.which')
     def test_blast_diamond_success(self, mock_which, mock_subprocess, sample_dna_sequence):
         """Test successful diamond BLAST execution."""
         mock_which.return_value = '/usr/bin/diamond'
-        mock_subprocess.return_value = MagicMock()
+        mock_subprocess.return_value = MagicMock(returncode=0)
         
         # Mock the output file content
-        diamond_output = "1\t30\tfeature1\t95.0\t100\tATCG\t30\t1\t30\t60\t1e-10\n"
+        diamond_output = "q0\t1\t30\tfeature1\t95.0\t100\tATCG\t30\t1\t30\t60\t1e-10\n"
         
         with patch('builtins.open', mock_open(read_data=diamond_output)):
             result = BLAST(sample_dna_sequence, {
@@ -144,6 +177,148 @@ class TestBLASTFunction:
             
         assert isinstance(result, pd.DataFrame)
         assert not result.empty
+        assert not result.attrs.get('search_failed')
+
+    @patch('plannotate.annotate.subprocess.run')
+    @patch('shutil.which')
+    def test_blast_batched_queries(self, mock_which, mock_subprocess, sample_dna_sequence):
+        """Test that batched queries are searched once and split by qseqid."""
+        mock_which.return_value = '/usr/bin/diamond'
+        mock_subprocess.return_value = MagicMock()
+
+        diamond_output = (
+            "q0\t1\t30\tfeature1\t95.0\t100\tATCG\t30\t1\t30\t60\t1e-10\n"
+            "q1\t5\t40\tfeature2\t90.0\t100\tATCG\t36\t1\t36\t60\t1e-8\n"
+            "q0\t40\t10\tfeature3\t99.0\t100\tATCG\t31\t1\t31\t60\t1e-12\n"
+        )
+
+        with patch('builtins.open', mock_open(read_data=diamond_output)):
+            result = BLAST(
+                [('seq 1', sample_dna_sequence), ('seq 2', sample_dna_sequence), ('seq3', sample_dna_sequence)],
+                {'method': 'diamond', 'db_loc': '/fake/db', 'parameters': ''},
+            )
+
+        assert mock_subprocess.call_count == 1
+        assert set(result.keys()) == {'seq 1', 'seq 2', 'seq3'}
+        assert len(result['seq 1']) == 2
+        assert len(result['seq 2']) == 1
+        assert result['seq3'].empty
+        assert 'qseqid' not in result['seq 1'].columns
+
+    def test_blast_malformed_batch(self, sample_dna_sequence):
+        """Test that tuples and batches of anything but (id, seq) pairs are rejected."""
+        with pytest.raises(TypeError, match=r"\(id, seq\)"):
+            BLAST([sample_dna_sequence], {'method': 'diamond'})
+        with pytest.raises(TypeError, match=r"\(id, seq\)"):
+            BLAST(('seq1', sample_dna_sequence), {'method': 'diamond'})
+
+    def test_blast_duplicate_query_ids(self, sample_dna_sequence):
+        """Test that repeated query ids are rejected rather than merged."""
+        with pytest.raises(ValueError, match="unique"):
+            BLAST([('a', sample_dna_sequence), ('a', sample_dna_sequence)], {'method': 'diamond'})
+
+    @patch('plannotate.annotate.subprocess.run')
+    @patch('shutil.which')
+    def test_blast_single_seq_and_bytes(self, mock_which, mock_subprocess, sample_dna_sequence):
+        """Test that Seq and bytes input are treated as a single query."""
+        mock_which.return_value = '/usr/bin/diamond'
+        mock_subprocess.return_value = MagicMock(returncode=0)
+        diamond_output = "q0\t1\t30\tfeature1\t95.0\t100\tATCG\t30\t1\t30\t60\t1e-10\n"
+
+        for query in (Seq(sample_dna_sequence), sample_dna_sequence.encode()):
+            with patch('builtins.open', mock_open(read_data=diamond_output)) as mocked:
+                result = BLAST(query, {'method': 'diamond', 'db_loc': '/fake/db', 'parameters': ''})
+            assert isinstance(result, pd.DataFrame)
+            assert len(result) == 1
+            written = mocked().write.call_args[0][0]
+            assert written == f">q0\n{sample_dna_sequence}\n".encode()
+
+    @patch('plannotate.annotate.rsc.get_max_threads', return_value=4)
+    @patch('plannotate.annotate.subprocess.run')
+    @patch('shutil.which')
+    def test_blast_caps_threads(self, mock_which, mock_subprocess, mock_threads, sample_dna_sequence):
+        """Test that blastn and cmscan thread counts are capped."""
+        mock_which.return_value = '/usr/bin/blastn'
+        mock_subprocess.return_value = MagicMock()
+
+        with patch('builtins.open', mock_open(read_data="")):
+            BLAST(sample_dna_sequence, {'method': 'blastn', 'db_loc': '/fake/db', 'parameters': '-num_threads 32'})
+        cmd = mock_subprocess.call_args[0][0]
+        assert cmd[cmd.index('-num_threads') + 1] == '4'
+        assert '-mt_mode' not in cmd
+
+        with patch('builtins.open', mock_open(read_data="")):
+            BLAST(
+                [('a', sample_dna_sequence), ('b', sample_dna_sequence)],
+                {'method': 'blastn', 'db_loc': '/fake/db', 'parameters': ''},
+            )
+        cmd = mock_subprocess.call_args[0][0]
+        assert cmd[cmd.index('-mt_mode') + 1] == '1'
+
+        with patch('plannotate.annotate.parse_infernal', return_value=pd.DataFrame()):
+            BLAST(sample_dna_sequence, {'method': 'infernal', 'db_loc': '/fake/db', 'parameters': ''})
+        cmd = mock_subprocess.call_args[0][0]
+        assert cmd[cmd.index('--cpu') + 1] == '4'
+
+    @patch('plannotate.annotate.rsc.get_max_threads', return_value=4)
+    def test_cap_threads_flag_without_value(self, mock_threads):
+        """Test that a thread flag given without a value has the cap filled in."""
+        assert _cap_threads("--noali --cpu", "--cpu") == ("--noali --cpu 4", 4)
+        assert _cap_threads("--cpu --noali", "--cpu") == ("--cpu 4 --noali", 4)
+        assert _cap_threads("--cpu 2", "--cpu") == ("--cpu 2", 2)
+
+    @patch('plannotate.annotate.subprocess.run')
+    @patch('shutil.which')
+    def test_blast_blastn_default_parameters(self, mock_which, mock_subprocess, sample_dna_sequence):
+        """Test that blastn defaults are applied and overridable per flag."""
+        mock_which.return_value = '/usr/bin/blastn'
+        mock_subprocess.return_value = MagicMock()
+
+        with patch('builtins.open', mock_open(read_data="")):
+            BLAST(sample_dna_sequence, {'method': 'blastn', 'db_loc': '/fake/db', 'parameters': '-word_size 12 -perc_identity 95'})
+        cmd = mock_subprocess.call_args[0][0]
+
+        assert cmd[cmd.index('-task') + 1] == 'dc-megablast'
+        assert cmd[cmd.index('-evalue') + 1] == '1e-5'
+        assert cmd[cmd.index('-culling_limit') + 1] == '1'
+        assert cmd.count('-word_size') == 1
+        assert cmd[cmd.index('-word_size') + 1] == '12'
+        assert cmd[cmd.index('-perc_identity') + 1] == '95'
+
+    @patch('plannotate.annotate.rsc.get_max_threads', return_value=4)
+    @patch('plannotate.annotate._cmscan')
+    @patch('shutil.which')
+    def test_blast_batched_infernal(self, mock_which, mock_cmscan, mock_threads, sample_dna_sequence):
+        """Test that batched cmscan runs are fanned out and split the thread cap."""
+        mock_which.return_value = '/usr/bin/cmscan'
+        mock_cmscan.side_effect = lambda seq, db, threads: pd.DataFrame({'qlen': [len(seq)]})
+
+        records = [('seq1', sample_dna_sequence), ('seq2', sample_dna_sequence[:10])]
+        result = BLAST(records, {'method': 'infernal', 'db_loc': '/fake', 'parameters': ''})
+
+        assert list(result.keys()) == ['seq1', 'seq2']
+        assert result['seq1']['qlen'].iloc[0] == len(sample_dna_sequence)
+        assert result['seq2']['qlen'].iloc[0] == 10
+        assert all(call.args[2] == 2 for call in mock_cmscan.call_args_list)
+
+        with patch('plannotate.annotate.concurrent.futures.ThreadPoolExecutor') as mock_pool:
+            result = BLAST(sample_dna_sequence, {'method': 'infernal', 'db_loc': '/fake', 'parameters': ''})
+        mock_pool.assert_not_called()
+        assert mock_cmscan.call_args.args[2] == 4
+
+    @patch('plannotate.annotate.subprocess.run')
+    @patch('shutil.which')
+    def test_blast_tool_failure_warns(self, mock_which, mock_subprocess, sample_dna_sequence):
+        """Test that a failing tool's stderr is surfaced as a warning."""
+        mock_which.return_value = '/usr/bin/diamond'
+        mock_subprocess.return_value = MagicMock(returncode=1, stderr=b"Error: database not found")
+
+        with pytest.warns(UserWarning, match="database not found"):
+            result = BLAST(sample_dna_sequence, {'method': 'diamond', 'db_loc': '/fake/db', 'parameters': ''})
+
+        assert result.empty
+        assert result.attrs['search_failed']
+        assert 'text' not in mock_subprocess.call_args[1]
 
     def test_blast_unknown_method(self, sample_dna_sequence):
         """Test BLAST behavior with unknown method."""
@@ -0,0 +1,184 @@
+import os
+import threading
+
+import pytest
+import pandas as pd
+
+from plannotate import cache
+
+
+@pytest.fixture
+def database_file(tmp_path):
+    """Empty stand-in for a database file."""
+    db_loc = tmp_path / "test_db.dmnd"
+    db_loc.write_bytes(b"")
+    return str(db_loc)
+
+
+@pytest.fixture
+def details_file(tmp_path):
+    """Custom feature details file for the test database."""
+    details_loc = tmp_path / "test_db_details.csv"
+    details_loc.write_text("sseqid,Feature,Description\n")
+    return str(details_loc)
+
+
+@pytest.fixture
+def yaml_file(tmp_path, database_file, details_file):
+    """Minimal database configuration file."""
+    yaml_loc = tmp_path / "databases.yml"
+    yaml_loc.write_text(
+        f"test_db:\n  method: diamond\n  location: {tmp_path}\n"
+        f"  details:\n    location: {details_file}\n    compressed: False\n"
+    )
+    return str(yaml_loc)
+
+
+@pytest.fixture
+def enable_cache(tmp_path, monkeypatch):
+    """Enable the annotation cache inside a temporary cache root."""
+    monkeypatch.setenv("PLANNOTATE_ANNOTATION_CACHE", "1")
+    monkeypatch.setenv("PLANNOTATE_DB_DIR", str(tmp_path / "cache"))
+
+
+def touch_later(file_loc):
+    stat = os.stat(file_loc)
+    os.utime(file_loc, (stat.st_atime, stat.st_mtime + 10))
+
+
+class TestAnnotationKey:
+    """Tests for cache key construction."""
+
+    def test_key_is_deterministic(self, yaml_file):
+        """Test that identical calls produce identical keys."""
+        assert cache.annotation_key("ATCG", yaml_file, True, False) == cache.annotation_key("ATCG", yaml_file, True, False)
+
+    def test_key_depends_on_arguments(self, yaml_file):
+        """Test that sequence and options all change the key."""
+        key = cache.annotation_key("ATCG", yaml_file, True, False)
+        assert key != cache.annotation_key("ATCC", yaml_file, True, False)
+        assert key != cache.annotation_key("ATCG", yaml_file, False, False)
+        assert key != cache.annotation_key("ATCG", yaml_file, True, True)
+
+    def test_key_changes_with_yaml_mtime(self, yaml_file):
+        """Test that touching the database configuration invalidates the key."""
+        key = cache.annotation_key("ATCG", yaml_file, True, False)
+        touch_later(yaml_file)
+        assert key != cache.annotation_key("ATCG", yaml_file, True, False)
+
+    def test_key_changes_with_database_mtime(self, yaml_file, database_file):
+        """Test that updating a database's files invalidates the key."""
+        key = cache.annotation_key("ATCG", yaml_file, True, False)
+        touch_later(database_file)
+        assert key != cache.annotation_key("ATCG", yaml_file, True, False)
+
+    def test_key_changes_with_details_mtime(self, yaml_file, details_file):
+        """Test that editing a custom details file invalidates the key."""
+        key = cache.annotation_key("ATCG", yaml_file, True, False)
+        touch_later(details_file)
+        assert key != cache.annotation_key("ATCG", yaml_file, True, False)
+
+    def test_key_changes_with_search_tool(self, yaml_file, tmp_path, monkeypatch):
+        """Test that installing or upgrading the search tool invalidates the key."""
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        key = cache.annotation_key("ATCG", yaml_file, True, False)
+
+        tool_loc = tmp_path / "bin" / "diamond"
+        tool_loc.parent.mkdir()
+        tool_loc.write_text("#!/bin/sh\n")
+        tool_loc.chmod(0o755)
+        installed = cache.annotation_key("ATCG", yaml_file, True, False)
+        assert key != installed
+
+        touch_later(tool_loc)
+        assert installed != cache.annotation_key("ATCG", yaml_file, True, False)
+
+
+class TestMemoizeAnnotate:
+    """Tests for the memoize_annotate decorator."""
+
+    def test_repeated_calls_hit_cache(self, yaml_file, enable_cache):
+        """Test that a repeated call does not re-run the annotation."""
+        calls = []
+
+        @cache.memoize_annotate
+        def fake_annotate(inSeq, yaml_file=yaml_file, linear=False, is_detailed=False):
+            calls.append(inSeq)
+            return pd.DataFrame({"Feature": ["GFP"], "qstart": [0]})
+
+        first = fake_annotate("ATCG", linear=True)
+        second = fake_annotate("ATCG", yaml_file, True)
+
+        assert len(calls) == 1
+        pd.testing.assert_frame_equal(first, second)
+
+        fake_annotate("ATCG", linear=False)
+        assert len(calls) == 2
+
+    def test_empty_results_not_cached(self, yaml_file, enable_cache):
+        """Test that empty results are recomputed on every call."""
+        calls = []
+
+        @cache.memoize_annotate
+        def fake_annotate(inSeq, yaml_file=yaml_file, linear=False, is_detailed=False):
+            calls.append(inSeq)
+            return pd.DataFrame()
+
+        fake_annotate("ATCG")
+        fake_annotate("ATCG")
+        assert len(calls) == 2
+
+    def test_skipped_databases_not_cached(self, yaml_file, enable_cache):
+        """Test that results missing a database's search are recomputed on every call."""
+        calls = []
+
+        @cache.memoize_annotate
+        def fake_annotate(inSeq, yaml_file=yaml_file, linear=False, is_detailed=False):
+            calls.append(inSeq)
+            result = pd.DataFrame({"Feature": ["GFP"]})
+            result.attrs["skipped_databases"] = ["test_db"]
+            return result
+
+        fake_annotate("ATCG")
+        fake_annotate("ATCG")
+        assert len(calls) == 2
+
+    def test_cache_is_opt_in(self, yaml_file, enable_cache, monkeypatch):
+        """Test that nothing is cached unless the environment variable is set."""
+        monkeypatch.delenv("PLANNOTATE_ANNOTATION_CACHE")
+        calls = []
+
+        @cache.memoize_annotate
+        def fake_annotate(inSeq, yaml_file=yaml_file, linear=False, is_detailed=False):
+            calls.append(inSeq)
+            return pd.DataFrame({"Feature": ["GFP"]})
+
+        fake_annotate("ATCG")
+        fake_annotate("ATCG")
+        assert len(calls) == 2
+        assert not os.path.exists(os.path.dirname(cache.get_cache_loc()))
+
+    def test_concurrent_writes(self, yaml_file, enable_cache):
+        """Test that results written from several threads are all kept."""
+
+        @cache.memoize_annotate
+        def fake_annotate(inSeq, yaml_file=yaml_file, linear=False, is_detailed=False):
+            return pd.DataFrame({"Feature": [inSeq]})
+
+        seqs = ["ACGT" * (i + 1) for i in range(8)]
+        threads = [threading.Thread(target=fake_annotate, args=(seq,)) for seq in seqs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        @cache.memoize_annotate
+        def not_called(inSeq, yaml_file=yaml_file, linear=False, is_detailed=False):
+            raise AssertionError("expected a cache hit")
+
+        for seq in seqs:
+            assert not_called(seq)["Feature"].tolist() == [seq]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,36 @@
+import pytest
+
+from tests.helpers import GFP_PACKED, pack2bit, unpack2bit
+
+
+class TestTwoBitEncoding:
+    """Tests for 2-bit sequence packing."""
+
+    @pytest.mark.parametrize("seq", ["", "A", "ACG", "ACGT", "ACGTA", "TTGACAGCTAGCTCAGTCCTAGGTATAATGCTAGC" * 10])
+    def test_round_trip(self, seq):
+        """Test that packing then unpacking returns the original sequence."""
+        assert unpack2bit(pack2bit(seq)) == seq
+
+    def test_packed_size(self):
+        """Test that four bases are stored per byte, plus a one byte header."""
+        assert len(pack2bit("ACGT" * 100)) == 101
+        assert len(pack2bit("ACGTA")) == 3
+
+    def test_lowercase_input(self):
+        """Test that lowercase input is accepted and decoded uppercase."""
+        assert unpack2bit(pack2bit("acgt")) == "ACGT"
+
+    def test_ambiguous_bases_rejected(self):
+        """Test that IUPAC ambiguity codes cannot be packed."""
+        with pytest.raises(ValueError, match="A/C/G/T"):
+            pack2bit("ACGNT")
+
+    def test_gfp_packed(self):
+        """Test that the packed GFP constant decodes to a complete coding sequence."""
+        gfp = unpack2bit(GFP_PACKED)
+        assert len(gfp) == 720
+        assert gfp.startswith("ATG") and gfp.endswith("TAA")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
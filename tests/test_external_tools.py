@@ -1,158 +1,88 @@
 import pytest
 import pandas as pd
 import os
-import tempfile
 import shutil
 from pathlib import Path
 
 from plannotate.annotate import BLAST
 from plannotate import resources as rsc
+from tests.helpers import DIAMOND_TEST_PARAMETERS, find_tools
 
 
 class TestExternalTools:
     """Test pLannotate with actual external tools (diamond, blastn, cmscan)."""
 
-    @pytest.fixture
-    def temp_dir(self):
-        """Create a temporary directory for test databases."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            yield temp_dir
-
-    @pytest.fixture
-    def test_protein_sequence(self):
-        """Test protein sequence for diamond testing."""
-        # This is a short GFP-like sequence that might have matches
-        return "MVSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTLTYGVQCFSRYPDHMKQHDFFKSAMPEGYVQERTIFFKDDGNYKTRAEVKFEGDTLVNRIELKGIDFKEDGNILGHKLEYNYNSHNVYIMADKQKNGIKVNFKIRHNIEDGSVQLADHYQQNTPIGDGPVLLPDNHYLSTQSALSKDPNEKRDHMVLLEFVTAAGITLGMDELYK"
-
-    @pytest.fixture
-    def test_dna_sequence(self):
-        """Test DNA sequence for blastn and cmscan testing."""
-        # A sequence that includes some common features
-        return ("ATGGTGAGCAAGGGCGAGGAGCTGTTCACCGGGGTGGTGCCCATCCTGGTCGAGCTGGACGGCGACGTAAACGGCCACAAGTTCAGCGTGTCCGGCGAGG"
-                "GCGAGGGCGATGCCACCTACGGCAAGCTGACCCTGAAGTTCATCTGCACCACCGGCAAGCTGCCCGTGCCCTGGCCCACCCTCGTGACCACCCTGACCTATG"
-                "GCGTGCAGTGCTTCAGCCGCTACCCCGACCACATGAAGCAGCACGACTTCTTCAAGTCCGCCATGCCCGAAGGCTACGTCCAGGAGCGCACCATCTTCTTCA"
-                "AGGACGACGGCAACTACAAGACCCGCGCCGAGGTGAAGTTCGAGGGCGACACCCTGGTGAACCGCATCGAGCTGAAGGGCATCGACTTCAAGGAGGACGGCA"
-                "ACATCCTGGGGCACAAGCTGGAGTACAACTACAACAGCCACAACGTCTATATCATGGCCGACAAGCAGAAGAACGGCATCAAGGTGAACTTCAAGATCCGCC"
-                "ACAACATCGAGGACGGCAGCGTGCAGCTCGCCGACCACTACCAGCAGAACACCCCCATCGGCGACGGCCCCGTGCTGCTGCCCGACAACCACTACCTGAGCA"
-                "CCCAGTCCGCCCTGAGCAAAGACCCCAACGAGAAGCGCGATCACATGGTCCTGCTGGAGTTCGTGACCGCCGCCGGGATCACTCTCGGCATGGACGAGCTGT"
-                "ACAAGTAA")
-
-    def test_diamond_availability(self):
+    def test_diamond_availability(self, tool_availability):
         """Test that diamond is available and working."""
-        result = shutil.which("diamond")
+        result = tool_availability["diamond"]
         assert result is not None, "diamond not found in PATH"
 
-    def test_blastn_availability(self):
+    def test_blastn_availability(self, tool_availability):
         """Test that blastn is available and working."""
-        result = shutil.which("blastn")
+        result = tool_availability["blastn"]
         assert result is not None, "blastn not found in PATH"
 
-    def test_cmscan_availability(self):
+    def test_find_tools_matches_which(self):
+        """Test that the single-pass PATH scan agrees with shutil.which."""
+        tools = ["diamond", "blastn", "cmscan", "python", "sh"]
+        assert find_tools(tools) == {tool: shutil.which(tool) for tool in tools}
+
+    def test_cmscan_availability(self, tool_availability):
         """Test that cmscan is available and working."""
-        result = shutil.which("cmscan")
+        result = tool_availability["cmscan"]
         assert result is not None, "cmscan not found in PATH"
 
-    def test_create_diamond_database(self, temp_dir, test_protein_sequence):
+    def test_create_diamond_database(self, diamond_db):
         """Test creating a diamond database from a protein FASTA file."""
-        # Create a test protein FASTA file
-        protein_fasta = os.path.join(temp_dir, "test_proteins.fasta")
-        with open(protein_fasta, 'w') as f:
-            f.write(">test_protein_1|GFP\n")
-            f.write("MVSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTLTYGVQCFSRYPDHMKQHDFFKSAMPEGYVQERTIFFKDDGNYKTRAEVKFEGDTLVNRIELKGIDFKEDGNILGHKLEYNYNSHNVYIMADKQKNGIKVNFKIRHNIEDGSVQLADHYQQNTPIGDGPVLLPDNHYLSTQSALSKDPNEKRDHMVLLEFVTAAGITLGMDELYK\n")
-            f.write(">test_protein_2|mCherry\n")
-            f.write("MVSKGEEDNMAIIKEFMRFKVHMEGSVNGHEFEIEGEGEGRPYEGTQTAKLKVTKGGPLPFAWDILSPQFMYGSKAYVKHPADIPDYLKLSFPEGFKWERVMNFEDGGVVTVTQDSSLQDGEFIYKVKLRGTNFPSDGPVMQKKTMGWEASSERMYPEDGALKGEIKQRLKLKDGGHYDAEVKTTYKAKKPVQLPGAYNVNIKLDITSHNEDYTIVEQYERAEGRHSTGGMDELYK\n")
+        assert os.path.exists(diamond_db), "Diamond database file not created"
 
-        # Create diamond database
-        db_path = os.path.join(temp_dir, "test_proteins.dmnd")
-        
-        import subprocess
-        result = subprocess.run([
-            "diamond", "makedb", 
-            "--in", protein_fasta,
-            "--db", os.path.join(temp_dir, "test_proteins")
-        ], capture_output=True, text=True)
-        
-        assert result.returncode == 0, f"Diamond makedb failed: {result.stderr}"
-        assert os.path.exists(db_path), "Diamond database file not created"
-
-    def test_create_blast_database(self, temp_dir, test_dna_sequence):
+    def test_create_blast_database(self, blast_db):
         """Test creating a BLAST database from a DNA FASTA file."""
-        # Create a test DNA FASTA file
-        dna_fasta = os.path.join(temp_dir, "test_dna.fasta")
-        with open(dna_fasta, 'w') as f:
-            f.write(">test_dna_1|GFP_gene\n")
-            f.write(test_dna_sequence + "\n")
-            f.write(">test_dna_2|promoter\n")
-            f.write("TTGACAGCTAGCTCAGTCCTAGGTATAATGCTAGC" * 10 + "\n")  # Synthetic promoter-like sequence
-
-        # Create BLAST database
-        import subprocess
-        result = subprocess.run([
-            "makeblastdb",
-            "-in", dna_fasta,
-            "-dbtype", "nucl",
-            "-out", os.path.join(temp_dir, "test_dna")
-        ], capture_output=True, text=True)
-        
-        assert result.returncode == 0, f"makeblastdb failed: {result.stderr}"
+        assert os.path.exists(blast_db + ".nsq") or os.path.exists(blast_db + ".nal"), "BLAST database files not created"
 
-    def test_diamond_search_functionality(self, temp_dir, test_dna_sequence):
+    def test_diamond_search_functionality(self, diamond_db, gfp_sequence):
         """Test diamond functionality with BLAST function."""
-        # Create minimal diamond database
-        protein_fasta = os.path.join(temp_dir, "proteins.fasta")
-        with open(protein_fasta, 'w') as f:
-            f.write(">P42212|GFP_AEQVI Green fluorescent protein\n")
-            f.write("MVSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTLTYGVQCFSRYPDHMKQHDFFKSAMPEGYVQERTIFFKDDGNYKTRAEVKFEGDTLVNRIELKGIDFKEDGNILGHKLEYNYNSHNVYIMADKQKNGIKVNFKIRHNIEDGSVQLADHYQQNTPIGDGPVLLPDNHYLSTQSALSKDPNEKRDHMVLLEFVTAAGITLGMDELYK\n")
-
-        import subprocess
-        subprocess.run([
-            "diamond", "makedb", 
-            "--in", protein_fasta,
-            "--db", os.path.join(temp_dir, "proteins")
-        ], check=True)
-
-        # Test diamond search
         db_config = {
             'method': 'diamond',
-            'db_loc': os.path.join(temp_dir, "proteins.dmnd"),
-            'parameters': '--id 50 --max-target-seqs 10'
+            'db_loc': diamond_db,
+            'parameters': f'--id 50 --max-target-seqs 10 {DIAMOND_TEST_PARAMETERS}'
         }
         
-        result = BLAST(test_dna_sequence, db_config)
+        result = BLAST(gfp_sequence, db_config)
         
         assert isinstance(result, pd.DataFrame)
         # Diamond should find matches or return empty DataFrame (both are valid)
 
-    def test_blastn_search_functionality(self, temp_dir, test_dna_sequence):
-        """Test blastn functionality with BLAST function."""
-        # Create minimal nucleotide database
-        dna_fasta = os.path.join(temp_dir, "nucleotides.fasta")
-        with open(dna_fasta, 'w') as f:
-            f.write(">test_seq|GFP_gene\n")
-            f.write(test_dna_sequence + "\n")
+    def test_diamond_batched_search(self, diamond_db, gfp_sequence):
+        """Test that several queries are searched in one diamond invocation."""
+        db_config = {
+            'method': 'diamond',
+            'db_loc': diamond_db,
+            'parameters': f'--id 50 --max-target-seqs 10 {DIAMOND_TEST_PARAMETERS}'
+        }
+
+        queries = [("gfp", gfp_sequence), ("gfp_head", gfp_sequence[:300])]
+        results = BLAST(queries, db_config)
 
-        import subprocess
-        subprocess.run([
-            "makeblastdb",
-            "-in", dna_fasta,
-            "-dbtype", "nucl",
-            "-out", os.path.join(temp_dir, "nucleotides")
-        ], check=True)
+        assert set(results.keys()) == {"gfp", "gfp_head"}
+        for result in results.values():
+            assert isinstance(result, pd.DataFrame)
 
-        # Test blastn search - this will use the online NCBI database
+    def test_blastn_search_functionality(self, blast_db, gfp_sequence):
+        """Test blastn functionality with BLAST function."""
         db_config = {
-            'method': 'blastn'
+            'method': 'blastn',
+            'db_loc': blast_db,
+            'parameters': '-perc_identity 95'
         }
         
-        # Use a shorter sequence for online search to avoid timeout
-        short_sequence = test_dna_sequence[:100]  # First 100 bp
+        short_sequence = gfp_sequence[:100]  # First 100 bp
         result = BLAST(short_sequence, db_config)
         
         assert isinstance(result, pd.DataFrame)
-        # Online blastn might return results or empty DataFrame depending on sequence
 
     @pytest.mark.skip(reason="Requires Rfam database which is large to download")
-    def test_cmscan_search_functionality(self, temp_dir, test_dna_sequence):
+    def test_cmscan_search_functionality(self, gfp_sequence):
         """Test cmscan functionality with BLAST function."""
         # Note: This test is skipped because it requires the actual Rfam database
         # which is large (~2GB). In practice, users would need to download it.
@@ -163,11 +93,11 @@ class TestExternalTools:
             'parameters': '--cpu 1'
         }
         
-        result = BLAST(test_dna_sequence, db_config)
+        result = BLAST(gfp_sequence, db_config)
         
         assert isinstance(result, pd.DataFrame)
 
-    def test_blast_with_invalid_database(self, temp_dir):
+    def test_blast_with_invalid_database(self):
         """Test BLAST functions handle invalid databases gracefully."""
         # Test diamond with non-existent database
         db_config = {
@@ -180,31 +110,18 @@ class TestExternalTools:
         assert isinstance(result, pd.DataFrame)
         assert result.empty  # Should return empty DataFrame
 
-    def test_tool_parameter_handling(self, temp_dir, test_dna_sequence):
+    def test_tool_parameter_handling(self, diamond_db, gfp_sequence):
         """Test that tool parameters are handled correctly."""
-        # Create minimal diamond database
-        protein_fasta = os.path.join(temp_dir, "test.fasta")
-        with open(protein_fasta, 'w') as f:
-            f.write(">test\nMVSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLT\n")
-
-        import subprocess
-        subprocess.run([
-            "diamond", "makedb", 
-            "--in", protein_fasta,
-            "--db", os.path.join(temp_dir, "test")
-        ], check=True)
-
         # Test with various parameters
         db_config = {
             'method': 'diamond',
-            'db_loc': os.path.join(temp_dir, "test.dmnd"),
-            'parameters': '--id 90 --max-target-seqs 5 --sensitive'
+            'db_loc': diamond_db,
+            'parameters': f'--id 90 --max-target-seqs 5 --sensitive {DIAMOND_TEST_PARAMETERS}'
         }
         
-        result = BLAST(test_dna_sequence, db_config)
+        result = BLAST(gfp_sequence, db_config)
         assert isinstance(result, pd.DataFrame)
 
-
 class TestRealWorldDatabases:
     """Test with databases that might exist on the system."""
 
@@ -237,14 +154,16 @@ class TestRealWorldDatabases:
         """Test that sample FASTA files exist for testing."""
         fastas_dir = Path(__file__).parent.parent / "plannotate" / "data" / "fastas"
         
-        fasta_files = list(fastas_dir.glob("*.fa"))
-        assert len(fasta_files) > 0, "No sample FASTA files found"
+        # only the first match is needed, so stop scanning once it is found
+        with os.scandir(fastas_dir) as entries:
+            sample_fasta = next(
+                (entry.path for entry in entries if entry.name.endswith(".fa")), None
+            )
+        assert sample_fasta is not None, "No sample FASTA files found"
         
         # Test one sample file
-        sample_fasta = fasta_files[0]
-        with open(sample_fasta) as f:
-            content = f.read()
-            assert content.startswith(">"), "Invalid FASTA format"
+        with open(sample_fasta, "rb") as f:
+            assert f.read(1) == b">", "Invalid FASTA format"
 
     @pytest.mark.integration
     def test_annotation_with_sample_sequence(self):
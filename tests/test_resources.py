@@ -342,6 +342,18 @@ class TestConstants:
         assert rsc.MAX_PLAS_SIZE == 50000
         assert isinstance(rsc.MAX_PLAS_SIZE, int)
 
+    def test_max_threads(self, monkeypatch):
+        """Test that the thread cap defaults to MAX_THREADS and honours the env override."""
+        monkeypatch.setattr(rsc.os, "cpu_count", lambda: 64)
+        monkeypatch.delenv("PLANNOTATE_MAX_THREADS", raising=False)
+        assert rsc.get_max_threads() == rsc.MAX_THREADS == 4
+
+        monkeypatch.setenv("PLANNOTATE_MAX_THREADS", "8")
+        assert rsc.get_max_threads() == 8
+
+        monkeypatch.setattr(rsc.os, "cpu_count", lambda: 2)
+        assert rsc.get_max_threads() == 2
+
     def test_df_cols(self):
         """Test that DF_COLS contains expected columns."""
         required_cols = [